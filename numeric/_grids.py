@@ -0,0 +1,21 @@
+"""
+Grid constructors shared by the solvers.
+"""
+from functools import lru_cache
+from typing import Callable
+import numpy as np
+
+
+def cached_ceil_step_grid(step_size: float) -> Callable:
+    """Uniform grids with steps of at most `step_size`, the number of steps is rounded up.
+
+    The grid depends only on its edge points, so repeated calls share one read-only grid.
+    """
+    @lru_cache(maxsize=16)
+    def _grid_constr(start, end):
+        niters = int(np.ceil(np.abs(end - start) / step_size + 1))
+        grid = np.linspace(start, end, niters)
+        grid.flags.writeable = False
+        return grid
+
+    return _grid_constr
@@ -3,23 +3,9 @@ Interpolation methods
 =====================
 """
 from abc import ABCMeta, abstractmethod
-from math import prod
 import numpy as np
 
 
-class _Lk():
-
-    def __init__(self, x: np.ndarray, k: int):
-
-        self.k = k
-        self.nodes = x
-
-    def __call__(self, x: np.ndarray) -> np.ndarray:
-        nodes = self.nodes
-        k = self.k
-        return prod([(x - node) / (nodes[k] - node) for i, node in enumerate(nodes) if i != k])
-
-
 class PolyInt():
     """Polynomial interpolation implementation using Lagrange polynomials.
 
@@ -30,6 +16,19 @@ class PolyInt():
         Grid nodes in which there are values of the interpolated function.
     values : (n, ) ndarray
         The values of the function in the nodes of the grid in which there are values of the interpolated function.
+    weights : (n, ) ndarray
+        Barycentric weights of the Lagrange polynomials, up to a common factor.
+
+    Examples
+    --------
+    Many Chebyshev nodes on short and long segments, the weights stay finite on both of them.
+
+    >>> for a, b in [(0, 1e-3), (0, 100)]:
+    ...     nodes = (a + b) / 2 + (b - a) / 2 * np.cos(np.pi * (np.arange(250) + 0.5) / 250)
+    ...     x = np.linspace(a, b, 1000)
+    ...     bool(np.allclose(PolyInt(nodes, np.cos(nodes / b))(x), np.cos(x / b)))
+    True
+    True
 
     See Also
     --------
@@ -42,6 +41,16 @@ class PolyInt():
         self.nodes = nodes
         self.values = values
 
+        # barycentric weights w_k = 1 / prod_{j != k} (x_k - x_j)
+        # in floating point, the products overflow integer nodes already for a few tens of them
+        diff = np.subtract.outer(nodes, nodes).astype(np.result_type(nodes, float))
+        # the interpolant does not depend on a common factor of the weights, the differences are
+        # scaled to a segment of length 4 so that the products neither overflow nor underflow
+        if nodes.shape[0] > 1:
+            diff *= 4 / (nodes.max() - nodes.min())
+        np.fill_diagonal(diff, 1)
+        self.weights = 1.0 / np.prod(diff, axis=1)
+
     def __call__(self, x: np.ndarray) -> np.ndarray:
         """Evalute Lagrange polynome.
         
@@ -57,8 +66,17 @@ class PolyInt():
 
         """
         values = self.values
-        nodes = self.nodes
-        return sum([yk*_Lk(nodes, k)(x) for k, yk in enumerate(values)])
+
+        x = np.asarray(x)
+        diff = x[..., None] - self.nodes
+        exact = diff == 0
+        diff[exact] = 1
+
+        kernel = self.weights / diff
+        solution = (kernel @ values) / kernel.sum(axis=-1)
+
+        # arguments at the nodes take the node values, the weighted form is 0/0 there
+        return np.where(exact.any(axis=-1), values[exact.argmax(axis=-1)], solution)[()]
 
 
 class _BaseSplines1d(metaclass=ABCMeta):
@@ -67,8 +85,24 @@ class _BaseSplines1d(metaclass=ABCMeta):
 
         assert nodes.shape == values.shape, "Nodes and their values vectors must have equal lenghs."
 
-        self.nodes = nodes
-        self.values = values
+        order = np.argsort(nodes, kind='stable')
+
+        self.nodes = nodes[order]
+        self.values = values[order]
+
+        steps = np.diff(self.nodes)
+        self._uniform = steps.size > 0 and np.allclose(steps, steps[0], rtol=1e-10, atol=0)
+        if self._uniform:
+            self._x0 = self.nodes[0]
+            self._dx = steps[0]
+
+    def _segment_index(self, x):
+        last = len(self.nodes) - 2
+        if self._uniform:
+            # fmin/fmax map NaN arguments to a valid segment, the NaN propagates to the result anyway
+            idx = np.floor((x - self._x0) / self._dx)
+            return np.fmax(np.fmin(idx, last), 0).astype(np.intp)
+        return np.clip(np.searchsorted(self.nodes, x) - 1, 0, last)
 
     @abstractmethod
     def _spline_func(self, x, y, segment):
@@ -111,27 +145,10 @@ class LinearSplines1d(_BaseSplines1d):
     """
 
     def _spline_func(self, x, y, segment):
-        node_0, node_1 = x
-        val_0, val_1 = y
-        slope = (segment - node_0) / (node_1 - node_0)
-        return val_0 + slope * (val_1 - val_0)
+        return np.interp(segment, x, y, left=np.nan, right=np.nan)
 
     def __call__(self, x):
-
-        nodes = self.nodes
-        values = self.values
-
-        solution = np.ones(x.shape, dtype=x.dtype) * np.nan
-
-        for i, _ in enumerate(nodes[:-1]):
-
-            nodes_segment =  nodes[[i, i+1]]
-            values_segment = values[[i, i+1]]
-            mapp = np.logical_and((nodes_segment[0] <= x), (x <= nodes_segment[1]))
-            segment = x[mapp]
-            solution[mapp] = self._spline_func(nodes_segment, values_segment, segment)
-
-        return solution
+        return self._spline_func(self.nodes, self.values, x)
 
 
 class CubicHermiteSplines1d(_BaseSplines1d):
@@ -144,6 +161,8 @@ class CubicHermiteSplines1d(_BaseSplines1d):
         Grid nodes in which there are values of the interpolated function.
     values : (n, ) ndarray
         The values of the function in the nodes of the grid in which there are values of the interpolated function.
+    derivative : (n, ) ndarray
+        Derivatives of the interpolated function in the nodes, central differences inside and zeros at the edges.
 
     See Also
     --------
@@ -151,37 +170,57 @@ class CubicHermiteSplines1d(_BaseSplines1d):
     LinearSplines1d : Linear splines interpolation implementation.
     """
 
-    def _spline_func(self, x, y, dydx, segment):
-
-        dt = x[1] - x[0]
-        t = (segment - x[0]) / dt
-
-        h00 = 2 * t**3 - 3 * t**2 + 1
-        h10 = t**3 - 2 * t**2 + t
-        h01 = -2 * t**3 + 3 * t**2
-        h11 = t**3 - t**2
+    def __init__(self, nodes: np.ndarray, values: np.ndarray):
 
-        return h00 * y[0] + h10 * dt * dydx[0] + h01 * y[1] + h11 * dt * dydx[1]
-
-    def __call__(self, x):
+        super().__init__(nodes, values)
 
         nodes = self.nodes
         values = self.values
 
-        derivative = np.zeros_like(nodes)
-        derivative[1:-1] = (values[2:] - values[:-2]) / (nodes[2:] - nodes[:-2])
+        self.derivative = np.empty_like(nodes)
+        self.derivative[0] = self.derivative[-1] = 0
+        self.derivative[1:-1] = (values[2:] - values[:-2]) / (nodes[2:] - nodes[:-2])
+
+        # per-segment lookup table, one column per segment: x0, 1/(x1 - x0), c0, c1, c2, c3
+        self._seg = np.empty((6, nodes.shape[0] - 1))
+        self._seg[0] = nodes[:-1]
+        self._seg[1] = 1 / np.diff(nodes)
+        self._seg[2:] = self._power_coefs(nodes, values, self.derivative)
 
-        solution = np.ones(x.shape, dtype=x.dtype) * np.nan
+    @staticmethod
+    def _power_coefs(x, y, dydx):
+        """Coefficients of the segment polynomials ``c0 + c1*u + c2*u**2 + c3*u**3``, ``u`` in ``[0, 1]``."""
+        dt = x[1:] - x[:-1]
+        y0, y1 = y[:-1], y[1:]
+        d0, d1 = dt * dydx[:-1], dt * dydx[1:]
 
-        for i in range(len(nodes)-1):
+        return np.stack([y0, d0, 3 * (y1 - y0) - 2 * d0 - d1, 2 * (y0 - y1) + d0 + d1])
 
-            nodes_segment = nodes[i: i+2]
-            values_segment = values[i: i+2]
-            derivative_segment = derivative[i: i+2]
+    def _spline_func(self, coef, u):
 
-            mapp = np.logical_and((nodes_segment[0] <= x), (x <= nodes_segment[1]))
-            segment = x[mapp]
+        c0, c1, c2, c3 = coef
 
-            solution[mapp] = self._spline_func(nodes_segment, values_segment, derivative_segment, segment)
+        # Horner scheme, in place
+        solution = c3 * u
+        solution += c2
+        solution *= u
+        solution += c1
+        solution *= u
+        solution += c0
 
         return solution
+
+    def __call__(self, x):
+
+        nodes = self.nodes
+
+        # there are no segments to interpolate on with a single node
+        if nodes.shape[0] < 2:
+            return np.full(np.shape(x), np.nan)
+
+        seg = self._seg.take(self._segment_index(x), axis=1)
+        u = (x - seg[0]) * seg[1]
+
+        solution = self._spline_func(seg[2:], u)
+
+        return np.where((nodes[0] <= x) & (x <= nodes[-1]), solution, np.nan)
@@ -21,6 +21,7 @@ Ordinary differential equation (ODE) solving methods implementation.
 from abc import ABCMeta, abstractmethod
 from typing import Callable
 import numpy as np
+from ._grids import cached_ceil_step_grid
 
 
 class _BasedODE(metaclass=ABCMeta):
@@ -33,37 +34,65 @@ class _BasedODE(metaclass=ABCMeta):
         self.y0 = y0
         self.interp = interp
 
+        if interp == 'linear':
+            self._interp_fn = self._linear_interp
+        elif interp == 'cubic':
+            self._interp_fn = self._cubic_hermite_interp
+        elif callable(interp):
+            self._interp_fn = self._callable_interp
+        else:
+            raise TypeError(f"interp must be 'linear', 'cubic' or Callable not {interp}.")
+
         if grid_constr is not None:
             self.grid_constr = grid_constr
         elif grid_constr is None and step_size is not None:
-            print(self._grid_step_size(0.01))
             self.grid_constr = self._grid_step_size(step_size)
         elif grid_constr is None and step_size is None:
             self.grid_constr = lambda f, y0, t: t
         else:
             raise ValueError("step_size and grid_constr are mutually exclusive arguments.")
 
+    # states of at least this size are stepped in preallocated buffers, smaller ones with plain expressions,
+    # which are cheaper than the ufunc calls with `out=` for them
+    _scratch_size = 64
+
     @abstractmethod
-    def _step(self, func, t0, dt, t1, y):
+    def _step(self, func, t0, dt, t1, y, f0, scratch):
         pass
 
     @staticmethod
     def _grid_step_size(step_size: float) -> np.ndarray:
 
+        _grid = cached_ceil_step_grid(step_size)
+
         def _grid_constr(func, y0, t):
-            start_time = t[0]
-            end_time = t[-1]
-            niters = int(np.ceil(np.abs(end_time - start_time) / step_size + 1))
-            return np.linspace(start_time, end_time, niters)
+            return _grid(t[0], t[-1])
 
         return _grid_constr
 
-    def _linear_interp(self, t0, t1, y0, y1, t):
+    def _linear_interp(self, t0, y0, f0, t1, y1, f1, t):
         slope = (t - t0) / (t1 - t0)
         return y0 + slope * (y1 - y0)
 
     def _cubic_hermite_interp(self, t0, y0, f0, t1, y1, f1, t):
-        pass
+        dt = t1 - t0
+        s = (t - t0) / dt
+
+        h00 = 2 * s**3 - 3 * s**2 + 1
+        h10 = s**3 - 2 * s**2 + s
+        h01 = -2 * s**3 + 3 * s**2
+        h11 = s**3 - s**2
+
+        return h00 * y0 + h10 * dt * f0 + h01 * y1 + h11 * dt * f1
+
+    def _callable_interp(self, t0, y0, f0, t1, y1, f1, t):
+        t = t.reshape(-1)
+
+        solution = np.empty((t.shape[0], *y0.shape), dtype=y0.dtype)
+        for i, ti in enumerate(t):
+            solution[i] = self.interp(t0, y0, f0, t1, y1, f1, ti)
+
+        return solution
 
     def __call__(self, t):
         """Calculate solution for `t`
@@ -79,40 +108,44 @@ class _BasedODE(metaclass=ABCMeta):
             Solving of equation.
 
         """
-        y0 = self.y0
+        func = self.func
+        step = self._step
+        y0 = np.asarray(self.y0)
 
-        time_grid = self.grid_constr(self.func, y0, t)
+        time_grid = self.grid_constr(func, y0, t)
         assert time_grid[0] == t[0] and time_grid[-1] == t[-1], "grid and real edge points must be equal."
 
-        solution = np.empty((t.shape[0], *y0.shape), dtype=y0.dtype)
-        solution[0] = y0
+        dtype = np.result_type(y0, np.float64)
+        if time_grid.shape[0] == 1:
+            return y0.astype(dtype)[None].repeat(t.shape[0], axis=0)
 
-        i = 1
-        for t0, t1 in zip(time_grid[:-1], time_grid[1:]):
+        # every point of `t` is matched with the grid interval (t0, t1] containing it and projected right after
+        # the interval is stepped, a decreasing grid is searched with the reversed sign of time
+        sign = 1 if time_grid[-1] > time_grid[0] else -1
+        idx = np.clip(np.searchsorted(sign * time_grid, sign * t) - 1, 0, time_grid.shape[0] - 2)
+        order = np.argsort(idx, kind='stable')
+        bounds = np.searchsorted(idx[order], np.arange(time_grid.shape[0]))
+        expand = (slice(None), ) + (None, ) * y0.ndim
 
-            dt = t1 - t0
-            dy = self._step(self.func, t0, dt, t1, y0)
-            y1 = y0 + dy
+        solution = np.empty((t.shape[0], *y0.shape), dtype=dtype)
+        y = y0.astype(dtype)
 
-            while i < t.shape[0] and t1 >= t[i]:
+        # func(t1, y1) of every step is the first stage of the next one and the slope for cubic projection
+        f = func(time_grid[0], y)
 
-                if self.interp == 'linear':
-                    solution[i] = self._linear_interp(t0, t1, y0, y1, t[i])
-                elif self.interp == 'cubic':
-                    pass
-                else:
-                    try:
+        scratch = None
+        if y0.size >= self._scratch_size:
+            scratch = {name: np.empty_like(y) for name in ('dy', 'stage', 'tmp')}
 
-                        f0 = self.func(t0, y0)
-                        f1 = self.func(t1, y1)
+        for k, (t0, t1) in enumerate(zip(time_grid[:-1], time_grid[1:])):
+            y1 = y + step(func, t0, t1 - t0, t1, y, f, scratch)
+            f1 = func(t1, y1)
 
-                        self.interp(t0, y0, f0, t1, y1, f1, t[i])
+            if bounds[k] < bounds[k+1]:
+                points = order[bounds[k]:bounds[k+1]]
+                solution[points] = self._interp_fn(t0, y, f, t1, y1, f1, t[points][expand])
 
-                    except TypeError:
-                        raise TypeError(f"interp must be 'linear', 'cubic' or Callable not {self.interp}.")
-                i += 1
-
-            y0 = y1
+            y, f = y1, f1
 
         return solution
 
@@ -144,8 +177,8 @@ class EulerSolver(_BasedODE):
     Интеграл аппроксимируется методом прямоугольника:
         - :math:`\int\limits_{x_0}^{x_0 + h}f(y,x)dx \\approx hf(y_0, x_0)`
     """
-    def _step(self, func, t0, dt, t1, y):
-        return dt*func(t0, y)
+    def _step(self, func, t0, dt, t1, y, f0, scratch):
+        return dt*f0
 
 
 class SimpsonSolver(_BasedODE):
@@ -171,13 +204,35 @@ class SimpsonSolver(_BasedODE):
     RK4Solver : Runge-Kutta ODE solver implementation.
     """
 
-    def _step(self, func, t0, dt, t1, y):
+    def _step(self, func, t0, dt, t1, y, f0, scratch):
+
+        if scratch is None:
+            q1 = f0
+            q2 = func(t0+0.5*dt, y+0.5*q1*dt)
+            q3 = func(t0+dt, y+0.5*q1*dt+0.5*q2*dt)
+
+            return dt*(q1+4*q2+q3)/6
+
+        dy, stage, tmp = scratch['dy'], scratch['stage'], scratch['tmp']
+
+        # every stage is accumulated into `dy` before `stage` is overwritten,
+        # since `func` may return its argument
+        q = f0
+        np.multiply(q, dt/6, out=dy)
+        np.multiply(q, 0.5*dt, out=stage)
+        stage += y
+
+        q = func(t0+0.5*dt, stage)
+        np.multiply(q, 4*dt/6, out=tmp)
+        dy += tmp
+        np.multiply(q, 0.5*dt, out=tmp)
+        stage += tmp
 
-        q1 = self.func(t0, y)
-        q2 = self.func(t0+0.5*dt, y+0.5*q1*dt)
-        q3 = self.func(t0+dt, y+0.5*q1*dt+0.5*q2*dt)
+        q = func(t0+dt, stage)
+        np.multiply(q, dt/6, out=tmp)
+        dy += tmp
 
-        return dt*(q1+4*q2+q3)/6
+        return dy
 
 
 class RK4Solver(_BasedODE):
@@ -203,11 +258,39 @@ class RK4Solver(_BasedODE):
     SimpsonSolver : ODE solver implementation with Smipson integrate approximation.
     """
 
-    def _step(self, func, t0, dt, t1, y):
+    def _step(self, func, t0, dt, t1, y, f0, scratch):
+
+        if scratch is None:
+            q1 = f0
+            q2 = func(t0+0.5*dt, y+0.5*q1*dt)
+            q3 = func(t0+0.5*dt, y+0.5*q2*dt)
+            q4 = func(t0+dt, y+q3*dt)
+
+            return dt*(q1+2*q2+2*q3+q4)/6
+
+        dy, stage, tmp = scratch['dy'], scratch['stage'], scratch['tmp']
+
+        # every stage is accumulated into `dy` before `stage` is overwritten,
+        # since `func` may return its argument
+        q = f0
+        np.multiply(q, dt/6, out=dy)
+        np.multiply(q, 0.5*dt, out=stage)
+        stage += y
+
+        q = func(t0+0.5*dt, stage)
+        np.multiply(q, dt/3, out=tmp)
+        dy += tmp
+        np.multiply(q, 0.5*dt, out=stage)
+        stage += y
+
+        q = func(t0+0.5*dt, stage)
+        np.multiply(q, dt/3, out=tmp)
+        dy += tmp
+        np.multiply(q, dt, out=stage)
+        stage += y
 
-        q1 = self.func(t0, y)
-        q2 = self.func(t0+0.5*dt, y+0.5*q1*dt)
-        q3 = self.func(t0+0.5*dt, y+0.5*q2*dt)
-        q4 = self.func(t0+dt, y+q3*dt)
+        q = func(t0+dt, stage)
+        np.multiply(q, dt/6, out=tmp)
+        dy += tmp
 
-        return dt*(q1+2*q2+2*q3+q4)/6
+        return dy
@@ -4,70 +4,82 @@ SDE solving methods
 
 Here are numerical solutions of some problems of partial differential equations.
 """
+from abc import ABCMeta, abstractmethod
+from functools import lru_cache
 from typing import Callable
 import numpy as np
+from scipy.linalg import get_lapack_funcs
+from ._grids import cached_ceil_step_grid
 
 
-class WaveEquationSolver1d:
-    """Solution of one-dimensional wave equation (string oscillation equation).
+def _solver_dtype(dtype):
+    """Floating point type of the solution, only the LAPACK precisions are supported."""
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise TypeError(f"dtype must be float32 or float64 not {dtype}.")
+    return dtype
 
-    Attributes
-    ----------
-    u0 : Callable
-        The initial value of the equation solution function (``u(t0,x) = u0(x)``).
-    ut0 : Callable
-        The value of the derivative of the time of solving the equation at the initial moment of time (``du/dt(t0,x) = ut0(x)``).
-    ua : Callable
-        The value of the solution function at point ``a`` on the segment ``[a,b]``.
-    ub : Callable
-        The value of the solution function at point ``b`` on the segment ``[a,b]``.
-    time_step : float or None, optional, default: None
-        The time step of the grid on which the problem is solved.
-    space_step : float or None, optional, default: None
-        The step of the grid in the space on which the problem is solved.
-    grid_constr : Callable, optional, default: None
-        A function that builds a grid on which the problem will be solved.
 
-    Examples
-    --------
-    .. code-block::
+@lru_cache(maxsize=32)
+def _tridiag_factor(diag, off, n, dtype):
+    """LDL^T factorization of the symmetric positive definite tridiagonal matrix with constant diagonals.
 
-        t0, t1 = 0, 4 * np.pi
-        x0, x1 = 0, 2 * np.pi
+    The factors are the precomputed forward sweep of the Thomas algorithm,
+    every solve with them is a single O(n) substitution. They are cached and shared
+    between solvers, so the returned arrays are read-only.
+    """
+    # the LAPACK wrappers reject an empty off-diagonal, a single interior node gets an unused dummy one
+    d, e = np.full(n, diag, dtype=dtype), np.full(max(n - 1, 1), off if n > 1 else 0, dtype=dtype)
+    pttrf, pttrs = get_lapack_funcs(('pttrf', 'pttrs'), (d,))
+    d, e, info = pttrf(d, e)
+    if info != 0:
+        raise np.linalg.LinAlgError("Matrix is not positive definite.")
+    d.flags.writeable = e.flags.writeable = False
+    return pttrs, (d, e)
 
-        t = np.linspace(t0,t1,200)
-        x = np.linspace(x0,x1,600)
 
-        u0 = lambda x: np.zeros_like(x)
-        ut0 = lambda x: np.exp(-(x-1)**2)*np.arctan(x)
-        ua = lambda t: np.zeros_like(t)
-        ub = lambda t: np.zeros_like(t)
+def _advance(solution, start, edges, ordinate_values, coefs, factor):
+    """Run the implicit scheme over the time layers from `start` to the last one of `edges`.
 
-        solver = WaveEquationSolver1d(u0, ut0, ua, ub)
-        u = solver(t, x, sigma=1.)
+    Layer ``i`` is stored in row ``i % len(solution)``, so `solution` holds either the whole history
+    or a ring of the latest layers. Negative row indices of the previous layers wrap around the ring.
+    """
+    pttrs, (d, e) = factor
+    left, right = edges
+    rows = solution.shape[0]
 
-        ax = plt.figure().add_subplot(projection='3d')
-        T, X = np.meshgrid(solver.time_grid_constr(t), solver.space_grid_constr(x))
-        surf = ax.plot_surface(T, X, u.T, cmap='magma', linewidth=0)
-        plt.show()
+    tmp = np.empty(solution.shape[1] - 2, dtype=solution.dtype)
 
-    See Also
-    --------
-    DiffusionEquationSolver1d : Numerical solver of the diffusion equation of the first order.
+    for i in range(start, left.shape[0]):
+        r = i % rows
+        solution[r, 0], solution[r, -1] = left[i], right[i]
+
+        # the right-hand side is assembled in the new row itself and solved in place,
+        # the row is contiguous and of the factors' dtype, so LAPACK should not copy it
+        b = solution[r, 1:-1]
+        ordinate_values(r, coefs, solution, b, tmp)
+        x, info = pttrs(d, e, b, overwrite_b=True)
+        if info != 0:
+            raise np.linalg.LinAlgError(f"Illegal argument {-info} of the tridiagonal solve.")
+        if not np.may_share_memory(x, b):
+            b[...] = x
+
+    return solution[(left.shape[0] - 1) % rows]
+
+
+class _BasedPDE(metaclass=ABCMeta):
+    """Base class for the implicit solvers of one-dimensional equations on a segment.
 
+    A scheme of order ``k`` computes every time layer from the ``k`` previous ones,
+    the first ``k`` layers are set by the initial conditions.
     """
 
-    def __init__(self,
-                 u0: Callable,
-                 ut0: Callable,
-                 ua: Callable,
-                 ub: Callable,
-                 time_step: float = None,
-                 space_step: float = None,
+    _order = 1
+
+    def __init__(self, u0: Callable, ua: Callable, ub: Callable, time_step: float = None, space_step: float = None,
                  grid_constr: Callable = None):
 
         self.u0 = u0
-        self.ut0 = ut0
         self.ua = ua
         self.ub = ub
         self.tau = time_step
@@ -88,37 +100,37 @@ class WaveEquationSolver1d:
     @staticmethod
     def _grid_step_size(step_size: float) -> np.ndarray:
 
+        _grid = cached_ceil_step_grid(step_size)
+
         def _grid_constr(val):
-            start = val[0]
-            end = val[-1]
-            niters = int(np.ceil(np.abs(end - start) / step_size + 1))
-            return np.linspace(start, end, niters)
+            return _grid(val[0], val[-1])
 
         return _grid_constr
 
     @staticmethod
-    def _coef_matrix(i, sigma, lam, u):
+    @abstractmethod
+    def _courant(tau, h):
+        pass
 
-        n = u.shape[1] - 2
-        A = -lam * sigma * np.eye(n, k=1)
-        A += (1 + 2 * lam * sigma) * np.eye(n)
-        A -= lam * sigma * np.eye(n, k=-1)
+    @staticmethod
+    def _check_stability(sigma, lam):
+        pass
 
-        return A
+    @abstractmethod
+    def _initial_layers(self, solution, t, space_grid):
+        pass
 
     @staticmethod
-    def _ordinate_values(i, sigma, lam, u):
+    @abstractmethod
+    def _ordinate_coefs(sigma, lam):
+        pass
 
-        b = (1 - 2 * sigma) * lam * u[i-1, 2:]
-        b += 2 * (1 - lam * (1 - 2 * sigma)) * u[i-1, 1:-1]
-        b += (1 - 2 * sigma) * lam * u[i-1, :-2]
-        b += sigma * lam * u[i-2, 2:]
-        b -= (1 + 2 * lam * sigma) * u[i-2, 1:-1]
-        b += lam * sigma * u[i-2, :-2]
-
-        return b
+    @staticmethod
+    @abstractmethod
+    def _ordinate_values(i, coefs, u, b, tmp):
+        pass
 
-    def __call__(self, t, x, sigma=1.):
+    def __call__(self, t, x, sigma=1., dtype=np.float64, keep_history=True):
         """Calculate solution for `t` time-array and `x` space-array.
 
         Parameters
@@ -129,53 +141,63 @@ class WaveEquationSolver1d:
             Values of space.
         sigma : floar, optional
             Viscosity parameter of the difference scheme (default 1). The parameter must be between 0 and 1.
+        dtype : data-type, optional
+            Floating point type of the solution and of the internal arrays (default ``np.float64``).
+            ``np.float32`` halves the memory traffic of the solver at the cost of precision,
+            the scheme coefficients and its stability bound are evaluated in it as well.
+        keep_history : bool, optional
+            Return the solution at every time layer (default True). Otherwise only the layers
+            the scheme needs are kept in memory and the last layer is returned.
 
         Returns
         -------
         u(t,x) : (new_n, new_m) ndarray
-            Solving of equation.
+            Solving of equation, ``(new_m, )`` layer at the final time if `keep_history` is False.
 
         """
 
-        u0 = self.u0
-        ut0 = self.ut0
         ua = self.ua
         ub = self.ub
+        order = self._order
 
         time_grid = self.time_grid_constr(t)
         space_grid = self.space_grid_constr(x)
 
-        tau, h = (self.tau, self.h) if self.tau is not None and self.tau is not None \
+        tau, h = (self.tau, self.h) if self.tau is not None and self.h is not None \
                          else (time_grid[1] - time_grid[0], space_grid[1] - space_grid[0])
-        lam = tau * tau / h / h
+
+        dtype = _solver_dtype(dtype)
+        sigma, lam = dtype.type(sigma), dtype.type(self._courant(tau, h))
+
+        self._check_stability(sigma, lam)
 
         assert time_grid[0] == t[0] and time_grid[-1] == t[-1], "grid and real edge points must be equal."
         assert space_grid[0] == x[0] and space_grid[-1] == x[-1], "grid and real edge points must be equal."
 
-        solution = np.empty((*time_grid.shape, *space_grid.shape), dtype=x.dtype)
-
-        solution[0] = u0(space_grid)
-        solution[1] = u0(space_grid) + (t[1]-t[0])*ut0(space_grid)
-        solution[:, 0] = ua(time_grid)
-        solution[:, -1] = ub(time_grid)
+        edges = np.broadcast_to(ua(time_grid), time_grid.shape), np.broadcast_to(ub(time_grid), time_grid.shape)
 
-        for i in range(2, len(time_grid)):
+        solution = np.empty((time_grid.shape[0] if keep_history else order + 1, *space_grid.shape), dtype=dtype)
 
-            A = self._coef_matrix(i, sigma, lam, solution)
-            b = self._ordinate_values(i, sigma, lam, solution)
+        self._initial_layers(solution, t, space_grid)
+        solution[:order, 0] = edges[0][:order]
+        solution[:order, -1] = edges[1][:order]
 
-            solution[i, 1:-1] = np.linalg.solve(A,b)
+        # the step matrix has `1 + 2*lam*sigma` on the diagonal and `-lam*sigma` next to it
+        factor = _tridiag_factor(1 + 2 * lam * sigma, -lam * sigma, space_grid.shape[0] - 2, dtype)
+        last = _advance(solution, order, edges, self._ordinate_values, self._ordinate_coefs(sigma, lam), factor)
 
-        return solution
+        return solution if keep_history else last.copy()
 
 
-class DiffusionEquationSolver1d:
-    """Solution of one-dimensional diffusion equation.
+class WaveEquationSolver1d(_BasedPDE):
+    """Solution of one-dimensional wave equation (string oscillation equation).
 
     Attributes
     ----------
     u0 : Callable
         The initial value of the equation solution function (``u(t0,x) = u0(x)``).
+    ut0 : Callable
+        The value of the derivative of the time of solving the equation at the initial moment of time (``du/dt(t0,x) = ut0(x)``).
     ua : Callable
         The value of the solution function at point ``a`` on the segment ``[a,b]``.
     ub : Callable
@@ -191,17 +213,18 @@ class DiffusionEquationSolver1d:
     --------
     .. code-block::
 
-        t0, t1 = 0, 4
+        t0, t1 = 0, 4 * np.pi
         x0, x1 = 0, 2 * np.pi
 
         t = np.linspace(t0,t1,200)
-        x = np.linspace(x0,x1,200)
+        x = np.linspace(x0,x1,600)
 
-        u0 = lambda x: np.sin(x)
+        u0 = lambda x: np.zeros_like(x)
+        ut0 = lambda x: np.exp(-(x-1)**2)*np.arctan(x)
         ua = lambda t: np.zeros_like(t)
         ub = lambda t: np.zeros_like(t)
 
-        solver = DiffusionEquationSolver1d(u0, ua, ub)
+        solver = WaveEquationSolver1d(u0, ut0, ua, ub)
         u = solver(t, x, sigma=1.)
 
         ax = plt.figure().add_subplot(projection='3d')
@@ -211,104 +234,131 @@ class DiffusionEquationSolver1d:
 
     See Also
     --------
-    WaveEquationSolver1d : Solution of one-dimensional wave equation (string oscillation equation).
+    DiffusionEquationSolver1d : Numerical solver of the diffusion equation of the first order.
 
     """
 
-    def __init__(self, u0, ua, ub, time_step: float = None, space_step: float = None, grid_constr = None):
+    _order = 2
 
-        self.u0 = u0
-        self.ua = ua
-        self.ub = ub
-        self.tau = time_step
-        self.h = space_step
+    def __init__(self,
+                 u0: Callable,
+                 ut0: Callable,
+                 ua: Callable,
+                 ub: Callable,
+                 time_step: float = None,
+                 space_step: float = None,
+                 grid_constr: Callable = None):
 
-        if grid_constr is not None:
-            self.time_grid_constr = grid_constr
-            self.space_grid_constr = grid_constr
-        elif grid_constr is None and time_step is not None and space_step is not None:
-            self.time_grid_constr = self._grid_step_size(time_step)
-            self.space_grid_constr = self._grid_step_size(space_step)
-        elif grid_constr is None and time_step is None and space_step is None:
-            self.time_grid_constr = lambda val: val
-            self.space_grid_constr = lambda val: val
-        else:
-            raise ValueError("step_size and grid_constr are mutually exclusive arguments.")
+        super().__init__(u0, ua, ub, time_step, space_step, grid_constr)
+        self.ut0 = ut0
 
     @staticmethod
-    def _grid_step_size(step_size: float) -> np.ndarray:
+    def _courant(tau, h):
+        return tau * tau / h / h
 
-        def _grid_constr(val):
-            start = val[0]
-            end = val[-1]
-            niters = int(np.ceil(np.abs(end - start) / step_size + 1))
-            return np.linspace(start, end, niters)
-
-        return _grid_constr
+    def _initial_layers(self, solution, t, space_grid):
+        solution[0] = self.u0(space_grid)
+        solution[1] = solution[0] + (t[1]-t[0])*self.ut0(space_grid)
 
     @staticmethod
-    def _coef_matrix(i, sigma, lam, u):
-
-        n = u.shape[1] - 2
-        A = -sigma*lam * sigma * np.eye(n, k=1) + (1+2*lam*sigma) * np.eye(n)  - lam * sigma * np.eye(n, k=-1)
+    def _ordinate_coefs(sigma, lam):
 
-        return A
+        # weights of u[i-1, j+1] + u[i-1, j-1], u[i-1, j], u[i-2, j+1] + u[i-2, j-1], u[i-2, j],
+        # the stencil is symmetric, so each pair of neighbours shares one weight
+        return ((1 - 2 * sigma) * lam, 2 * (1 - lam * (1 - 2 * sigma)),
+                sigma * lam, -(1 + 2 * lam * sigma))
 
     @staticmethod
-    def _ordinate_values(i, sigma, lam, u):
+    def _ordinate_values(i, coefs, u, b, tmp):
+
+        c1, c2, c3, c4 = coefs
 
-        b = (1 - sigma) * lam * u[i-1, 2:]
-        b += (1 - 2 * (1 - sigma) * lam) * u[i-1,1:-1]
-        b += (1 - sigma) * lam * u[i-1, :-2]
+        np.add(u[i-1, 2:], u[i-1, :-2], out=b)
+        b *= c1
+        np.multiply(u[i-1, 1:-1], c2, out=tmp)
+        b += tmp
+        np.add(u[i-2, 2:], u[i-2, :-2], out=tmp)
+        tmp *= c3
+        b += tmp
+        np.multiply(u[i-2, 1:-1], c4, out=tmp)
+        b += tmp
 
         return b
 
-    def __call__(self, t, x, sigma=1.):
-        """Calculate solution for `t` time-array and `x` space-array.
 
-        Parameters
-        ----------
-        t : (n, ) np.ndarray
-            Values of time.
-        x : (m, ) np.ndarray
-            Values of space.
-        sigma : floar, optional
-            Viscosity parameter of the difference scheme (default 1). The parameter must be between 0 and 1.
+class DiffusionEquationSolver1d(_BasedPDE):
+    """Solution of one-dimensional diffusion equation.
 
-        Returns
-        -------
-        u(t,x) : (new_n, new_m) ndarray
-            Solving of equation.
+    Attributes
+    ----------
+    u0 : Callable
+        The initial value of the equation solution function (``u(t0,x) = u0(x)``).
+    ua : Callable
+        The value of the solution function at point ``a`` on the segment ``[a,b]``.
+    ub : Callable
+        The value of the solution function at point ``b`` on the segment ``[a,b]``.
+    time_step : float or None, optional, default: None
+        The time step of the grid on which the problem is solved.
+    space_step : float or None, optional, default: None
+        The step of the grid in the space on which the problem is solved.
+    grid_constr : Callable, optional, default: None
+        A function that builds a grid on which the problem will be solved.
 
-        """
+    Examples
+    --------
+    .. code-block::
 
-        u0 = self.u0
-        ua = self.ua
-        ub = self.ub
+        t0, t1 = 0, 4
+        x0, x1 = 0, 2 * np.pi
 
-        time_grid = self.time_grid_constr(t)
-        space_grid = self.space_grid_constr(x)
+        t = np.linspace(t0,t1,200)
+        x = np.linspace(x0,x1,200)
 
-        tau, h = (self.tau, self.h) if self.tau is not None and self.tau is not None \
-                         else (time_grid[1] - time_grid[0], space_grid[1] - space_grid[0])
-        lam = tau / h / h
+        u0 = lambda x: np.sin(x)
+        ua = lambda t: np.zeros_like(t)
+        ub = lambda t: np.zeros_like(t)
+
+        solver = DiffusionEquationSolver1d(u0, ua, ub)
+        u = solver(t, x, sigma=1.)
 
-        assert tau <= h * h / 2 / (1 - sigma) if sigma < 1 else True, "The scheme diverges, choose other sizes of grid steps."
+        ax = plt.figure().add_subplot(projection='3d')
+        T, X = np.meshgrid(solver.time_grid_constr(t), solver.space_grid_constr(x))
+        surf = ax.plot_surface(T, X, u.T, cmap='magma', linewidth=0)
+        plt.show()
 
-        assert time_grid[0] == t[0] and time_grid[-1] == t[-1], "grid and real edge points must be equal."
-        assert space_grid[0] == x[0] and space_grid[-1] == x[-1], "grid and real edge points must be equal."
+    See Also
+    --------
+    WaveEquationSolver1d : Solution of one-dimensional wave equation (string oscillation equation).
 
-        solution = np.empty((*time_grid.shape, *space_grid.shape), dtype=x.dtype)
+    """
+
+    @staticmethod
+    def _courant(tau, h):
+        return tau / h / h
+
+    @staticmethod
+    def _check_stability(sigma, lam):
+        # tau <= h*h/2/(1-sigma), checked in the precision of the solution
+        assert sigma >= 1 or 2 * (1 - sigma) * lam <= 1, "The scheme diverges, choose other sizes of grid steps."
 
-        solution[0] = u0(space_grid)
-        solution[:, 0] = ua(time_grid)
-        solution[:, -1] = ub(time_grid)
+    def _initial_layers(self, solution, t, space_grid):
+        solution[0] = self.u0(space_grid)
 
-        for i in range(1, len(time_grid)):
+    @staticmethod
+    def _ordinate_coefs(sigma, lam):
+
+        # weights of u[i-1, j+1] + u[i-1, j-1], u[i-1, j],
+        # the stencil is symmetric, so the pair of neighbours shares one weight
+        return (1 - sigma) * lam, 1 - 2 * (1 - sigma) * lam
 
-            A = self._coef_matrix(i, sigma, lam, solution)
-            b = self._ordinate_values(i, sigma, lam, solution)
+    @staticmethod
+    def _ordinate_values(i, coefs, u, b, tmp):
 
-            solution[i, 1:-1] = np.linalg.solve(A,b)
+        c1, c2 = coefs
 
-        return solution
+        np.add(u[i-1, 2:], u[i-1, :-2], out=b)
+        b *= c1
+        np.multiply(u[i-1, 1:-1], c2, out=tmp)
+        b += tmp
+
+        return b
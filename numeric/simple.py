@@ -44,18 +44,28 @@ Simple operations
 Вторая производная может быть рассчитана как (тоже через Тейлора и подстановку приближения первой производной)
 
 .. math::
-    f''(a) = \dfrac{f(a+h) - 2f(a) + f(a+h)}{h^2}
+    f''(a) = \dfrac{f(a+h) - 2f(a) + f(a-h)}{h^2}
 
 .. math::
-    f(a+h) + f(a+h) = 2f(a) + f''(a)h^2 + O(h^2) \Rightarrow
+    f(a+h) + f(a-h) = 2f(a) + f''(a)h^2 + O(h^2) \Rightarrow
 
-    \Rightarrow f''(a) = \dfrac{f(a+h) + f(a+h) - 2f(a)}{h^2} + O(h^2)
+    \Rightarrow f''(a) = \dfrac{f(a+h) + f(a-h) - 2f(a)}{h^2} + O(h^2)
 """
 
 from typing import Callable
 import numpy as np
 
-def derivative(func: Callable, start: float, end: float, h: float = 0.1, type: str = 'central') -> np.ndarray:
+
+def _round_step_grid(start: float, end: float, h: float) -> np.ndarray:
+    if start is None or end is None:
+        raise ValueError("Either x or both start and end must be given.")
+
+    # the number of nodes is rounded once, `np.arange` with a float step may gain or lose the last node
+    return np.linspace(start, end, int(round((end - start) / h)) + 1)
+
+
+def derivative(func: Callable, start: float = None, end: float = None, h: float = 0.1, type: str = 'central',
+               x: np.ndarray = None, out: np.ndarray = None) -> np.ndarray:
     """First derivative for function of one variable.
 
     Parameters
@@ -73,6 +83,10 @@ def derivative(func: Callable, start: float, end: float, h: float = 0.1, type: s
         Differentiation step.
     type : str {'left', 'right', 'central'}, default: `central`
         Type of difference approximation of the first derivative.
+    x : (n, ) ndarray, optional
+        Nodes of the grid. If given, `start` and `end` are ignored.
+    out : (n, ) ndarray, optional
+        Array in which the result is stored.
 
     Returns
     -------
@@ -84,12 +98,13 @@ def derivative(func: Callable, start: float, end: float, h: float = 0.1, type: s
     See Also
     --------
     second_derivative : Second derivative for function of one variable.
+    derivatives : First and second central derivatives for function of one variable.
 
     Notes
     -----
     The difference schemes look like this:
         - left: :math:`f'(x) \\approx \dfrac{f(x+h) - f(x)}{h}`
-        - right: :math:`f'(x) \\approx \dfrac{f(x+h) - f(x)}{h}`
+        - right: :math:`f'(x) \\approx \dfrac{f(x) - f(x-h)}{h}`
         - central :math:`f'(x) \\approx \dfrac{f(x+h) - f(x-h)}{2h}`
 
     References
@@ -100,22 +115,29 @@ def derivative(func: Callable, start: float, end: float, h: float = 0.1, type: s
     --------
 
     >>> h, start, end = 0.1, -2*np.pi, 2*np.pi
-    >>> x = np.arange(start, end+h, h)
+    >>> x = np.linspace(start, end, 127)
     >>> func = lambda x: np.sin(x)/np.cosh(x)*x**2
     >>> df = derivative(func, h=h, start=start, end=end)
     """
     schemes = {
-        'left': lambda f, x, h: (f(x+h) - f(x)) / h,
-        'right': lambda f, x, h: (f(x) - f(x-h)) / h,
-        'central': lambda f, x, h: (f(x+h) - f(x-h)) / 2 / h
+        'left': lambda f, x, h: (f(x+h), f(x), h),
+        'right': lambda f, x, h: (f(x), f(x-h), h),
+        'central': lambda f, x, h: (f(x+h), f(x-h), 2*h)
     }
 
     scheme = schemes[type]
-    x = np.arange(start, end+h, h)
+    if x is None:
+        x = _round_step_grid(start, end, h)
+
+    f_right, f_left, step = scheme(func, x, h)
+    # integer values of `func` are differentiated in floating point
+    df = np.subtract(f_right, f_left, out=out, dtype=None if out is not None else np.result_type(f_right, f_left, 1.))
+    df *= 1 / step
 
-    return x, scheme(func, x, h)
+    return x, df
 
-def second_derivative(func: Callable, start: np.ndarray, end: np.ndarray, h: float = 0.1) -> np.ndarray:
+def second_derivative(func: Callable, start: float = None, end: float = None, h: float = 0.1,
+                      x: np.ndarray = None, out: np.ndarray = None) -> np.ndarray:
     """Second derivative for function of one variable.
 
     Parameters
@@ -131,6 +153,10 @@ def second_derivative(func: Callable, start: np.ndarray, end: np.ndarray, h: flo
         which the derivative is considered.
     h : float, default: `0.1`
         Differentiation step.
+    x : (n, ) ndarray, optional
+        Nodes of the grid. If given, `start` and `end` are ignored.
+    out : (n, ) ndarray, optional
+        Array in which the result is stored.
 
     Returns
     -------
@@ -142,11 +168,12 @@ def second_derivative(func: Callable, start: np.ndarray, end: np.ndarray, h: flo
     See Also
     --------
     derivative : First derivative for function of one variable.
+    derivatives : First and second central derivatives for function of one variable.
 
     Notes
     -----
     The difference scheme look like this:
-        - :math:`f''(a) \\approx \dfrac{f(x+h) + f(x+h) - 2f(x)}{h^2}`
+        - :math:`f''(x) \\approx \dfrac{f(x+h) + f(x-h) - 2f(x)}{h^2}`
 
     References
     ----------
@@ -156,12 +183,127 @@ def second_derivative(func: Callable, start: np.ndarray, end: np.ndarray, h: flo
     --------
 
     >>> h, start, end = 0.1, -2*np.pi, 2*np.pi
-    >>> x = np.arange(start, end+h, h)
+    >>> x = np.linspace(start, end, 127)
     >>> func = lambda x: np.sin(x)/np.cosh(x)*x**2
     >>> ddf = second_derivative(func, h=h, start=start, end=end)
     """
-    x = np.arange(start, end+h, h)
-    return x, (func(x+h) + func(x-h) - 2*func(x)) / h / h
+    if x is None:
+        x = _round_step_grid(start, end, h)
+
+    f_right, f_left = func(x+h), func(x-h)
+    ddf = np.add(f_right, f_left, out=out, dtype=None if out is not None else np.result_type(f_right, f_left, 1.))
+    ddf -= 2*func(x)
+    ddf *= 1 / (h*h)
+
+    return x, ddf
+
+
+def derivatives(func: Callable, start: float = None, end: float = None, h: float = 0.1,
+                x: np.ndarray = None) -> tuple:
+    """First and second central derivatives for function of one variable.
+
+    Parameters
+    ----------
+    func : Callable[np.ndarray] -> np.ndarray
+        The function that will be differentiated.
+        The function must be one-dimensional and elementwise.
+    start : float
+        The initial value of the segment on
+        which the derivative is calculated.
+    end : float
+        The final value of the segment on
+        which the derivative is considered.
+    h : float, default: `0.1`
+        Differentiation step.
+    x : (n, ) ndarray, optional
+        Nodes of the grid. If given, `start` and `end` are ignored.
+
+    Returns
+    -------
+    x : (n, ) ndarray
+        Nodes of the grid on which differentiation is carried out.
+    f'(x) : (n, ) ndarray
+        Numerical values of the first derivative in the grid nodes.
+    f''(x) : (n, ) ndarray
+        Numerical values of the second derivative in the grid nodes.
+
+    See Also
+    --------
+    derivative : First derivative for function of one variable.
+    second_derivative : Second derivative for function of one variable.
+
+    Notes
+    -----
+    Both derivatives share the values :math:`f(x+h)`, :math:`f(x)`, :math:`f(x-h)`,
+    which are calculated by a single call of `func` on the concatenated arguments.
+
+    Examples
+    --------
+
+    >>> h, start, end = 0.1, -2*np.pi, 2*np.pi
+    >>> func = lambda x: np.sin(x)/np.cosh(x)*x**2
+    >>> x, df, ddf = derivatives(func, h=h, start=start, end=end)
+    """
+    if x is None:
+        x = _round_step_grid(start, end, h)
+
+    f_right, f_mid, f_left = func(np.concatenate([x+h, x, x-h])).reshape(3, *x.shape)
+
+    # integer values of `func` are differentiated in floating point
+    dtype = np.result_type(f_right, 1.)
+
+    df = np.subtract(f_right, f_left, dtype=dtype)
+    df *= 0.5 / h
+
+    ddf = np.add(f_right, f_left, dtype=dtype)
+    ddf -= f_mid
+    ddf -= f_mid
+    ddf *= 1 / (h*h)
+
+    return x, df, ddf
+
+
+def _as_array(x):
+    # arrays implementing the NumPy array protocols (e.g. ``cupy.ndarray``) are kept on their device
+    return x if hasattr(x, '__array_function__') else np.asarray(x)
+
+
+def _cheb_recurrence(x: np.ndarray, first: np.ndarray, n: int, block: int = 32768) -> np.ndarray:
+    """Degree `n` term of the recurrence ``p(k+1) = 2x p(k) - p(k-1)`` with ``p(0) = 1`` and ``p(1) = first``.
+
+    The argument is processed in blocks of `block` points, so the rotating buffers of a block
+    stay in cache for all `n` steps instead of streaming the whole array from memory on every step.
+
+    Only ``*_like`` constructors, slicing and ufuncs with ``out=`` are used, so arrays implementing
+    the NumPy array protocols (e.g. ``cupy.ndarray``) are evaluated on their own device. Such arrays
+    are processed in one block, each step being a single kernel launch over the whole argument.
+    """
+    x_flat, first_flat = x.reshape(-1), first.reshape(-1)
+    solution = np.empty_like(x_flat)
+
+    if not isinstance(x_flat, np.ndarray):
+        block = max(x_flat.size, 1)
+
+    size = min(block, x_flat.size)
+    x2_buf, i0_buf, i1_buf, res_buf = (np.empty_like(solution, shape=size) for _ in range(4))
+
+    for start in range(0, x_flat.size, block):
+        stop = min(start + block, x_flat.size)
+        m = stop - start
+
+        x2 = np.multiply(x_flat[start:stop], 2, out=x2_buf[:m])
+        i0, i1, res = i0_buf[:m], i1_buf[:m], res_buf[:m]
+        i0.fill(1)
+        i1[...] = first_flat[start:stop]
+
+        for _ in range(2, n+1):
+            np.multiply(x2, i1, out=res)
+            res -= i0
+            i0, i1, res = i1, res, i0
+
+        solution[start:stop] = i1
+
+    return solution.reshape(x.shape)[()]
 
 
 def cheb_poly_1(x: np.ndarray, n: int) -> np.ndarray:
@@ -185,7 +327,8 @@ def cheb_poly_1(x: np.ndarray, n: int) -> np.ndarray:
 
     Notes
     -----
-
+    `x` may be any array supporting the NumPy array protocols, e.g. a ``cupy.ndarray``
+    is evaluated on the GPU and the result stays there.
 
     References
     ----------
@@ -197,20 +340,17 @@ def cheb_poly_1(x: np.ndarray, n: int) -> np.ndarray:
     >>> x = np.linspace(-1,1,100)
     >>> y = cheb_poly_1(x, 3)
     """
-    i0 = np.ones_like(x)
-    i1 = x
+    if n < 0:
+        raise ValueError(f"Chebyshev polynomial degree must be non-negative, got {n}.")
+
+    x = _as_array(x)
 
     if n == 0:
-        res = i0
+        return np.ones_like(x)
     elif n == 1:
-        res = i1
-    else:
-        for i in range(2, n+1):
-            res = 2*x*i1 - i0
-            i0 = i1
-            i1 = res
+        return x
 
-    return res
+    return _cheb_recurrence(x, x, n)
 
 
 def cheb_poly_2(x: np.ndarray, n: int) -> np.ndarray:
@@ -234,7 +374,8 @@ def cheb_poly_2(x: np.ndarray, n: int) -> np.ndarray:
 
     Notes
     -----
-
+    `x` may be any array supporting the NumPy array protocols, e.g. a ``cupy.ndarray``
+    is evaluated on the GPU and the result stays there.
 
     References
     ----------
@@ -246,18 +387,14 @@ def cheb_poly_2(x: np.ndarray, n: int) -> np.ndarray:
     >>> x = np.linspace(-1,1,100)
     >>> y = cheb_poly_2(x, 3)
     """
+    if n < 0:
+        raise ValueError(f"Chebyshev polynomial degree must be non-negative, got {n}.")
 
-    i0 = np.ones_like(x)
-    i1 = 2*x
+    x = _as_array(x)
 
     if n == 0:
-        res = i0
+        return np.ones_like(x)
     elif n == 1:
-        res = i1
-    else:
-        for _ in range(2, n+1):
-            res = 2*x*i1 - i0
-            i0 = i1
-            i1 = res
+        return 2*x
 
-    return res
+    return _cheb_recurrence(x, 2*x, n)